@@ -1,8 +1,14 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 import streamlit as st
 import pandas as pd
+import numpy as np
+import requests
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # ---------------------------------------------------------
 # 1. 페이지 설정
@@ -16,79 +22,249 @@ st.set_page_config(
 # ---------------------------------------------------------
 # 2. 데이터 로드 및 유틸리티
 # ---------------------------------------------------------
-@st.cache_data(ttl=60)
-def load_data_final_v31(url):
+@st.cache_resource
+def get_http_session():
+    """[HTTP 세션] GitHub raw 요청(HEAD/GET)이 keep-alive 연결과 gzip 전송을 재사용"""
+    return requests.Session()
+
+def fetch_excel(url):
+    """엑셀 파일을 내려받아 calamine에 바로 넘길 수 있는 BytesIO로 반환"""
+    resp = get_http_session().get(url, timeout=30)
+    resp.raise_for_status()
+    return io.BytesIO(resp.content)
+
+def read_workbook(url, **kwargs):
+    """
+    [엑셀 파싱] 한 번 내려받은 바이트로 calamine 파싱
+    calamine 미설치 환경이면 같은 버퍼를 openpyxl(read_only)로 파싱 (재다운로드 없음)
+    """
+    buf = fetch_excel(url)
     try:
-        df = pd.read_excel(url, engine='openpyxl')
-    except Exception as e:
-        st.error(f"⚠️ 데이터 로드 실패: {e}")
-        return pd.DataFrame()
+        return pd.read_excel(buf, engine='calamine', **kwargs)
+    except ImportError:
+        buf.seek(0)
+        return pd.read_excel(buf, engine='openpyxl', **kwargs)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_remote_version(url):
+    """
+    [원격 파일 버전 확인]
+    ETag(없으면 Last-Modified)만 HEAD로 조회 -> 파일이 바뀐 경우에만 로더 캐시가 갱신됨
+    헤더를 못 받으면 고정값 'none'으로 대체 -> 갱신 시점은 로더 캐시의 ttl(1일)이 결정
+    ※ 다운로드/파싱(GET) 실패는 로더가 예외로 올려 캐시되지 않으므로 다음 rerun에서 바로 재시도됨
+    """
+    try:
+        resp = get_http_session().head(url, timeout=10, allow_redirects=True)
+        version = resp.headers.get('ETag') or resp.headers.get('Last-Modified')
+    except requests.RequestException:
+        version = None
+    return version or "none"
+
+# [로더 캐시] 버전(ETag)이 같으면 재다운로드·파싱 없이 재사용, 하루(ttl)가 지나면 강제 갱신
+# (persist="disk"는 ttl을 무시하므로 사용하지 않음)
+@st.cache_data(ttl=24 * 3600, max_entries=4)
+def load_data_final_v31(url, version):
+    """
+    [가스레인지 사용유무 데이터 로드]
+    version: get_remote_version() 값 (캐시 키로만 사용)
+    다운로드/파싱 실패는 예외로 올림 (st.cache_data는 예외를 캐시하지 않음 -> 호출부에서 표시)
+    """
+    use_cols = {'년월', '시군구', '용도', '총청구계량기수', '가스레인지연결전수'}
+    # [필요 컬럼만 파싱] 상품명/사용량 등 화면에서 쓰지 않는 컬럼은 읽지 않음 (사용량은 사이드바 입력값 사용)
+    df = read_workbook(url, usecols=lambda c: str(c).replace(' ', '').strip() in use_cols)
 
     df.columns = df.columns.astype(str).str.replace(' ', '').str.strip()
     
-    target_cols = ['총청구계량기수', '가스레인지연결전수', '사용량(m3)']
+    target_cols = [c for c in ['총청구계량기수', '가스레인지연결전수'] if c in df.columns]
     for col in target_cols:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.replace(',', '')
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+        df[col] = to_number(df[col])
     
     if '년월' in df.columns:
-        df['년월'] = df['년월'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-        df['Date'] = pd.to_datetime(df['년월'], format='%Y%m', errors='coerce')
+        # [날짜 생성] YYYYMM 정수 -> 연(//100)/월(%100) 정수 연산으로 바로 datetime64 생성 (문자열/정규식 파싱 없음)
+        ym = pd.to_numeric(df['년월'], errors='coerce')
+        df['Date'] = pd.to_datetime(dict(year=ym // 100, month=ym % 100, day=1), errors='coerce')
         df = df.dropna(subset=['Date'])
     
+    # [연도/월 정수형 변환] 로드 시 한 번만 계산 (필터 후에도 그대로 유지됨)
+    df['Year'] = df['Date'].dt.year.astype('int16')
+    df['Month'] = df['Date'].dt.month.astype('int8')
+
+    # [범주형 변환] 필터(isin)/groupby가 문자열 대신 정수 코드로 동작
+    for c in ['시군구', '용도']:
+        if c in df.columns:
+            df[c] = df[c].astype('category')
+
+    # [사전 집계] 상품명 단위 행을 (Date, 시군구, 용도) 단위로 합산 -> 필터/groupby 대상 행 수 축소
+    # sort=True: 날짜/지역/용도 순 정렬 -> 이후 groupby(sort=False) 결과도 날짜/지역 순서가 유지됨
+    df = df.groupby(['Date', 'Year', 'Month', '시군구', '용도'], observed=True, sort=True, as_index=False)[target_cols].sum()
+
+    # [다운캐스트] 계량기 수는 가장 작은 정수형(현재 데이터 기준 int32)
+    for col in target_cols:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    
     # 파생 변수
     if '총청구계량기수' in df.columns and '가스레인지연결전수' in df.columns:
         df['인덕션_추정_수'] = df['총청구계량기수'] - df['가스레인지연결전수']
-        df['인덕션_전환율'] = df.apply(lambda x: (x['인덕션_추정_수']/x['총청구계량기수']*100) if x['총청구계량기수']>0 else 0, axis=1)
-    
-    # [연도 정수형 변환]
-    df['Year'] = df['Date'].dt.year.astype(int)
 
     return df
 
-@st.cache_data(ttl=60)
-def load_sales_data_final_v31():
+@st.cache_data(ttl=24 * 3600, max_entries=4)
+def load_sales_data_final_v31(url, version):
     """
     [판매량 데이터 로드]
     단위: 천m³ -> m³ (* 1000)
+    version: get_remote_version() 값 (캐시 키로만 사용)
+    다운로드/파싱 실패는 예외로 올림 (실패 결과가 캐시에 남지 않도록)
     """
-    url = "https://raw.githubusercontent.com/Han11112222/citygas-induction-dashboard/main/%ED%8C%90%EB%A7%A4%EB%9F%89(%EA%B3%84%ED%9A%8D_%EC%8B%A4%EC%A0%81).xlsx"
+    # 합산 대상 컬럼
+    household_cols = ['취사용', '개별난방용', '중앙난방용', '자가열전용']
+    other_cols = ['일반용', '업무난방용', '냉방용', '산업용', '수송용(CNG)', '수송용(BIO)', '열병합용', '연료전지용', '열전용설비용', '주한미군']
+    all_cols = household_cols + other_cols
+    use_cols = set(['연', '월'] + all_cols)
+
+    # [필요 컬럼만 파싱] 소계/빈 컬럼 등은 읽지 않음 (헤더 공백 제거 후 이름으로 판단)
+    df = read_workbook(url, sheet_name='실적_부피',
+                      usecols=lambda c: str(c).replace(' ', '').strip() in use_cols)
+    df.columns = df.columns.astype(str).str.replace(' ', '').str.strip()
     
-    try:
-        df = pd.read_excel(url, engine='openpyxl', sheet_name='실적_부피')
-        df.columns = df.columns.astype(str).str.replace(' ', '').str.strip()
-        
-        if '연' in df.columns and '월' in df.columns:
-             df['Year'] = pd.to_numeric(df['연'], errors='coerce').fillna(0).astype(int)
-             df['Date'] = pd.to_datetime(df['Year'].astype(str) + df['월'].astype(str).str.zfill(2) + '01', errors='coerce')
-        
-        # 합산 대상 컬럼
-        household_cols = ['취사용', '개별난방용', '중앙난방용', '자가열전용']
-        other_cols = ['일반용', '업무난방용', '냉방용', '산업용', '수송용(CNG)', '수송용(BIO)', '열병합용', '연료전지용', '열전용설비용', '주한미군']
-        all_cols = household_cols + other_cols
-        
-        # 숫자 변환
-        for col in all_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(',', '')
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            else:
-                df[col] = 0
-        
-        # [단위 보정] 천m³ -> m³ (무조건 * 1000)
-        df['가정용_판매량_전체'] = df[household_cols].sum(axis=1) * 1000
-        df['기타_판매량_전체'] = df[other_cols].sum(axis=1) * 1000
-        df['전체_판매량'] = df['가정용_판매량_전체'] + df['기타_판매량_전체']
-        
-        return df[['Year', 'Date', '가정용_판매량_전체', '전체_판매량']]
-             
-    except Exception as e:
-        return pd.DataFrame()
+    if '연' in df.columns and '월' in df.columns:
+         df['Year'] = pd.to_numeric(df['연'], errors='coerce').fillna(0).astype(int)
+         # [날짜 생성] 문자열 조합/파싱 없이 연·월 정수에서 바로 datetime64 생성
+         df['Date'] = pd.to_datetime(dict(year=df['Year'], month=pd.to_numeric(df['월'], errors='coerce'), day=1), errors='coerce')
+    
+    # 숫자 변환
+    for col in all_cols:
+        if col in df.columns:
+            df[col] = to_number(df[col])
+        else:
+            df[col] = 0
+    
+    # [단위 보정] 천m³ -> m³ (무조건 * 1000)
+    # (14개 컬럼을 2차원 배열로 한 번만 꺼내서 NumPy로 행 합계)
+    vals = df[all_cols].to_numpy()
+    df['가정용_판매량_전체'] = vals[:, :len(household_cols)].sum(axis=1) * 1000
+    df['기타_판매량_전체'] = vals[:, len(household_cols):].sum(axis=1) * 1000
+    df['전체_판매량'] = df['가정용_판매량_전체'] + df['기타_판매량_전체']
+    
+    return df[['Year', 'Date', '가정용_판매량_전체', '전체_판매량']]
+
+@st.cache_data(max_entries=4)
+def load_sales_yearly_v31(url, version):
+    """
+    [판매량 연도별 사전 집계]
+    월별 판매량(캐시)을 연도별 합계로 한 번만 집계 (필터와 무관하므로 버전 단위 캐시)
+    Year를 인덱스로 반환 -> 연도별 Stock에 join(on='Year')로 바로 붙임
+    version=None: 이번 실행에서 판매량 로드 실패 -> 재다운로드 없이 빈 집계 반환
+    """
+    df = load_sales_data_final_v31(url, version) if version is not None else pd.DataFrame()
+    if df.empty:
+        return pd.DataFrame(columns=['Year', '가정용_판매량_전체', '전체_판매량']).set_index('Year')
+    return df.groupby('Year', observed=True, sort=False)[['가정용_판매량_전체', '전체_판매량']].sum()
+
+@st.cache_data(max_entries=4)
+def load_dec_stock_v31(url, version):
+    """
+    [12월 기준 Stock 사전 집계]
+    원본(캐시, 이미 (Date, 시군구, 용도) 단위 집계)에서 12월 행만 추출 -> 화면에서는 필터 후 연도별 합계만 계산
+    """
+    df = load_data_final_v31(url, version)
+    if df.empty:
+        return df
+    return df.loc[df['Month'] == 12, ['Date', 'Year', '시군구', '용도', '총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].reset_index(drop=True)
+
+def apply_global_filter(df, start_date, end_date, regions, types):
+    """사이드바 전역 필터 (datetime64 직접 비교 -> 행마다 date 객체를 만들지 않음)"""
+    start_ts = pd.Timestamp(start_date).to_datetime64()
+    end_ts = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_datetime64()
+    date_values = df['Date'].to_numpy()
+    mask = (date_values >= start_ts) & (date_values < end_ts)
+    # 범주형 코드(int8)로 직접 비교, 전체 선택(기본값)인 컬럼은 비교 생략
+    for col, selected in (('시군구', regions), ('용도', types)):
+        cats = df[col].cat.categories
+        if len(selected) < len(cats):
+            mask &= np.isin(df[col].cat.codes.to_numpy(), cats.get_indexer(selected))
+    return df[mask]
+
+# [캐시 상한] 필터 조합마다 항목이 쌓이므로 최근 32개만 유지 (오래된 항목부터 제거)
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_trend_tables(gas_url, gas_version, sales_url, sales_version, start_date, end_date, regions, types):
+    """
+    [Menu 1 집계 파이프라인]
+    월별 집계(df_m) + 12월 연도별 집계/판매량 병합(df_year)
+    필터 조합(기간/지역/용도)이 같으면 groupby/merge 없이 캐시 결과 반환
+    (사용량 입력값에만 의존하는 손실 컬럼은 add_loss_estimates에서 계산)
+    """
+    df = apply_global_filter(load_data_final_v31(gas_url, gas_version), start_date, end_date, regions, types)
+    df_sales_year = load_sales_yearly_v31(sales_url, sales_version)
+
+    # Year/Month를 같이 키로 두어 아래 12월 추출에서 .dt 접근자 재계산 없이 로더 값을 그대로 사용
+    df_m = df.groupby(['Date', 'Year', 'Month'], observed=True, sort=False, as_index=False)[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum()
+    df_m['전환율'] = safe_pct(df_m['인덕션_추정_수'].to_numpy(), df_m['총청구계량기수'].to_numpy())
+
+    # 12월 연도별 집계 = 월별 집계(df_m)의 12월 행 (원본 재스캔/재집계 불필요)
+    df_year_stock = df_m.loc[df_m['Month'] == 12, ['Year', '총청구계량기수', '가스레인지연결전수', '인덕션_추정_수', '전환율']].reset_index(drop=True)
+    # 화면/다운로드용 월별 표는 기존 컬럼 구성 유지
+    df_m = df_m.drop(columns=['Year', 'Month'])
+    
+    df_year = df_year_stock.join(df_sales_year, on='Year', how='left')
+    if not df_sales_year.empty:
+        df_year['가정용_판매량_전체'] = df_year['가정용_판매량_전체'].fillna(0)
+        df_year['전체_판매량'] = df_year['전체_판매량'].fillna(0)
+    else:
+        df_year['가정용_판매량_전체'] = 0
+        df_year['전체_판매량'] = 0
+
+    return df_m, df_year
+
+def add_loss_estimates(df_year, input_monthly_usage):
+    """
+    [손실 추정 컬럼]
+    연도별 집계(10여 행)에 사용량 입력값을 곱하는 단계만 분리 -> 사용량만 바꾸면 groupby/merge 캐시는 그대로 사용
+    """
+    df_year = df_year.copy()
+    # 연간 총 손실량 / 잠재 판매량을 NumPy 배열로 한 번에 계산
+    loss = df_year['인덕션_추정_수'].to_numpy(dtype=float) * (input_monthly_usage * 12)
+    pot_home = df_year['가정용_판매량_전체'].to_numpy(dtype=float) + loss
+    pot_total = df_year['전체_판매량'].to_numpy(dtype=float) + loss
+
+    df_year.insert(df_year.columns.get_loc('전환율') + 1, '연간손실추정_m3', loss)
+    df_year['잠재_가정용'] = pot_home
+    df_year['손실점유율_가정'] = safe_pct(loss, pot_home)
+    df_year['잠재_전체'] = pot_total
+    df_year['손실점유율_전체'] = safe_pct(loss, pot_total)
+
+    return df_year
 
 @st.cache_data
 def convert_df(df):
-    return df.to_csv(index=False).encode('utf-8-sig')
+    """
+    [CSV 다운로드 데이터]
+    download_button에 partial(convert_df, df)로 넘겨서 클릭 시에만 생성
+    (BytesIO에 바로 인코딩하여 기록 -> 중간 str 복사 없음)
+    """
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding='utf-8-sig')
+    return buf.getvalue()
+
+def to_number(s):
+    """
+    [숫자 변환]
+    이미 숫자형인 컬럼은 문자열 변환을 생략, 문자열이면 천단위 콤마 제거 후 변환
+    """
+    if not pd.api.types.is_numeric_dtype(s):
+        s = s.astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(s, errors='coerce').fillna(0)
+
+def safe_pct(num, den):
+    """
+    [비율(%) 계산]
+    분모가 0인 행은 inf/NaN 대신 0으로 처리
+    """
+    num = np.asarray(num)
+    den = np.asarray(den)
+    out = np.zeros(len(den), dtype=np.float32)
+    np.divide(num, den, out=out, where=den > 0)
+    return out * 100
 
 # --- [디자인] 컬러 팔레트 ---
 COLOR_GAS = '#1f77b4'       # 기본 파랑
@@ -99,13 +275,267 @@ COLOR_HIGHLIGHT_BG = '#a4c2f4' # 하이라이트 배경
 COLOR_HIGHLIGHT_LINE = '#1f77b4' # 하이라이트 선
 COLOR_TEXT_LIGHTGREY = 'lightgrey' # 그래프 내부 텍스트 색상
 
+# --- [그래프] 이중 축(좌: 수량 / 우: 비율) 공통 레이아웃 ---
+# make_subplots(secondary_y=True)와 같은 축 구성을 한 번만 만들어 재사용 (우축 트레이스는 yaxis='y2')
+DUAL_AXIS_LAYOUT = go.Layout(
+    xaxis=dict(anchor='y', domain=[0.0, 0.94]),
+    yaxis=dict(anchor='x', domain=[0.0, 1.0]),
+    yaxis2=dict(anchor='x', overlaying='y', side='right')
+)
+
+# --- [그래프] 분석 Figure 빌더 ---
+# 같은 입력(집계 결과)이면 캐시된 Figure를 그대로 사용하여 add_trace 재실행을 생략
+# (필터/사용량 입력값마다 항목이 생기므로 max_entries로 상한 설정)
+@st.cache_data(max_entries=32)
+def build_monthly_trend_fig(df_m):
+    """[1] 월별 세대 구성(누적) 및 전환율 추이"""
+    # 트레이스/레이아웃을 한 번에 넘겨 Figure 생성 (add_trace 반복 검증 생략)
+    return go.Figure(
+        data=[
+            go.Scatter(x=df_m['Date'].to_numpy(), y=df_m['가스레인지연결전수'].to_numpy(), name='가스레인지', stackgroup='one', line=dict(color=COLOR_GAS)),
+            go.Scatter(x=df_m['Date'].to_numpy(), y=df_m['인덕션_추정_수'].to_numpy(), name='인덕션(추정)', stackgroup='one', line=dict(color=COLOR_INDUCTION)),
+            go.Scattergl(x=df_m['Date'].to_numpy(), y=df_m['전환율'].to_numpy(), name='전환율(%)', yaxis='y2', mode='lines+markers', line=dict(color=COLOR_LINE)),
+        ],
+        layout=dict(
+            yaxis2=dict(overlaying='y', side='right'), 
+            hovermode="x unified", 
+            legend=dict(orientation="h", y=1.1),
+            height=600,
+            uirevision='static'
+        )
+    )
+
+@st.cache_data(max_entries=32)
+def build_yearly_stock_fig(df_year, start_highlight_year, end_highlight_year):
+    """[2-1] 연도별 세대 구성(12월) 및 전환율"""
+    fig_q = go.Figure(layout=DUAL_AXIS_LAYOUT)
+    fig_q.add_traces([
+        go.Bar(x=df_year['Year'].to_numpy(), y=df_year['가스레인지연결전수'].to_numpy(), name='가스레인지(12월)', marker_color=COLOR_GAS),
+        go.Bar(x=df_year['Year'].to_numpy(), y=df_year['인덕션_추정_수'].to_numpy(), name='인덕션(12월)', marker_color=COLOR_INDUCTION),
+        # 텍스트 위치: bottom center
+        go.Scatter(
+            x=df_year['Year'].to_numpy(), y=df_year['전환율'].to_numpy(), name='전환율(%)', mode='lines+markers+text', 
+            texttemplate='%{y:.1f}%', 
+            textposition='bottom center', 
+            textfont=dict(size=20, color=COLOR_TEXT_LIGHTGREY), 
+            line=dict(color=COLOR_LINE, width=3),
+            yaxis='y2'
+        ),
+    ])
+    
+    if start_highlight_year:
+        # 텍스트 제거하고 라인/배경만 유지
+        fig_q.add_vrect(
+            x0=start_highlight_year-0.5, x1=end_highlight_year+0.5, 
+            fillcolor=COLOR_HIGHLIGHT_BG, opacity=0.4, layer="below", line_width=0
+        )
+        fig_q.add_vline(
+            x=start_highlight_year-0.5, line_width=2, line_dash="dash", line_color=COLOR_HIGHLIGHT_LINE,
+        )
+
+    fig_q.update_layout(
+        barmode='stack', legend=dict(orientation="h", y=1.1), height=500, hovermode="x unified",
+        yaxis=dict(title_text="세대수 (12월 기준)"),
+        yaxis2=dict(title_text="전환율 (%)", range=[0, df_year['전환율'].max()*1.2])
+    )
+    return fig_q
+
+@st.cache_data(max_entries=32)
+def build_yearly_loss_fig(df_year_filtered, latest_year_val, latest_loss_val):
+    """[2-2] 연간 가정용 손실량 추정 및 비중"""
+    fig_loss = go.Figure(layout=DUAL_AXIS_LAYOUT)
+
+    # 1축: 손실량 (막대)
+    traces = [go.Bar(
+        x=df_year_filtered['Year'].to_numpy(),
+        y=df_year_filtered['연간손실추정_m3'].to_numpy(),
+        name='연간 손실량(m³)',
+        marker_color=COLOR_LOSS_BLUE,
+    )]
+    
+    # 최신 연도 라벨
+    if pd.notna(latest_year_val):
+        traces.append(go.Scatter(
+            x=[latest_year_val],
+            y=[latest_loss_val],
+            mode='text',
+            text=[f"{latest_loss_val:,.0f} m³"],
+            textposition="top center",
+            textfont=dict(size=15, color=COLOR_LOSS_BLUE, family="Arial Black"),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+
+    # 2축: 비중 (선) - 텍스트 위치 bottom center, lightgrey
+    traces.append(go.Scatter(
+        x=df_year_filtered['Year'].to_numpy(),
+        y=df_year_filtered['손실점유율_가정'].to_numpy(),
+        name='손실 비중(%, 가정용 대비)',
+        mode='lines+markers+text', 
+        texttemplate='%{y:.1f}%', 
+        textposition='bottom center', 
+        textfont=dict(size=16, color=COLOR_TEXT_LIGHTGREY), 
+        line=dict(color=COLOR_LINE, width=3),
+        yaxis='y2'
+    ))
+    fig_loss.add_traces(traces)
+
+    fig_loss.update_layout(
+        height=500, legend=dict(orientation="h", y=1.1), hovermode="x unified",
+        yaxis=dict(title_text="연간 손실량 (m³)"),
+        yaxis2=dict(title_text="손실 비중 (%)", range=[0, df_year_filtered['손실점유율_가정'].max()*1.2], showticklabels=False)
+    )
+    return fig_loss
+
+@st.cache_data(max_entries=32)
+def build_sales_loss_fig(df_year_filtered, sales_col, sales_name, share_col):
+    """[하단 그래프] 판매량 vs 손실 추정량"""
+    fig_u = go.Figure(layout=DUAL_AXIS_LAYOUT)
+    fig_u.add_traces([
+        go.Bar(x=df_year_filtered['Year'].to_numpy(), y=df_year_filtered[sales_col].to_numpy(), name=sales_name, marker_color=COLOR_GAS, opacity=0.7),
+        go.Bar(x=df_year_filtered['Year'].to_numpy(), y=df_year_filtered['연간손실추정_m3'].to_numpy(), name='손실량(우측)', marker_color=COLOR_LOSS_BLUE),
+        go.Scatter(x=df_year_filtered['Year'].to_numpy(), y=df_year_filtered[share_col].to_numpy(), name='손실 비중', mode='lines+markers+text', texttemplate='%{y:.2f}%', textposition='top center', line=dict(color=COLOR_LINE, width=2), yaxis='y2'),
+    ])
+    fig_u.update_layout(
+        barmode='stack', legend=dict(orientation="h", y=1.1), height=500,
+        yaxis=dict(title_text="사용량 (m³)"),
+        yaxis2=dict(title_text="손실 비중 (%)", showticklabels=False)
+    )
+    return fig_u
+
+# --- [상세 분석] 드릴다운 섹션 ---
+# st.fragment: 섹션 내 선택 위젯(연도/지역)을 바꾸면 해당 섹션만 다시 실행
+@st.fragment
+def render_gu_drilldown(df):
+    """[3] 연도 선택 -> 구군별 비교 (12월 기준)"""
+    st.subheader("3️⃣ 상세 분석: 연도 선택 ➡️ 구군별 비교")
+    # df는 로드 시 날짜순으로 정렬되어 있으므로 unique() 결과도 이미 오름차순
+    sel_year = st.selectbox("📅 분석할 연도를 선택하세요:", df['Year'].unique()[::-1])
+    
+    # 12월 데이터가 없으면 해당 연도의 마지막 월 기준 (12월이 있으면 12월이 곧 마지막 월)
+    # 날짜순 정렬 상태 -> 마지막 월 행 구간을 searchsorted로 바로 슬라이스 (연도/날짜 마스크 생략)
+    dates = df['Date'].to_numpy()
+    hi = dates.searchsorted(np.datetime64(f"{sel_year + 1}-01-01")) if sel_year is not None else 0
+    lo = dates.searchsorted(dates[hi - 1]) if hi > 0 else 0
+    df_gu_stock = df.iloc[lo:hi].groupby('시군구', observed=True, sort=False, as_index=False)[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum()
+
+    df_gu_stock['전환율'] = safe_pct(df_gu_stock['인덕션_추정_수'].to_numpy(), df_gu_stock['총청구계량기수'].to_numpy())
+    
+    c3, c4 = st.columns(2)
+    with c3:
+        fig_gu1 = go.Figure(layout=DUAL_AXIS_LAYOUT)
+        fig_gu1.add_traces([
+            go.Bar(x=df_gu_stock['시군구'].to_numpy(), y=df_gu_stock['가스레인지연결전수'].to_numpy(), name='가스레인지', marker_color=COLOR_GAS),
+            go.Bar(x=df_gu_stock['시군구'].to_numpy(), y=df_gu_stock['인덕션_추정_수'].to_numpy(), name='인덕션', marker_color=COLOR_INDUCTION),
+            go.Scattergl(x=df_gu_stock['시군구'].to_numpy(), y=df_gu_stock['전환율'].to_numpy(), name='전환율(%)', mode='lines+markers+text',
+                         texttemplate='%{y:.1f}%', textposition='top center',
+                         line=dict(color=COLOR_LINE, width=3), yaxis='y2'),
+        ])
+        fig_gu1.update_layout(title=f"[{sel_year}년] 구군별 세대 구성 (12월 기준)", barmode='stack', legend=dict(orientation="h", y=-0.2), height=500, uirevision='static')
+        st.plotly_chart(fig_gu1, use_container_width=True)
+
+    with c4:
+        df_gu_sort = df_gu_stock.sort_values(by='인덕션_추정_수', ascending=False)
+        fig_gu2 = px.bar(df_gu_sort, x='시군구', y='인덕션_추정_수', text_auto='.2s', 
+                         title=f"[{sel_year}년] 구군별 인덕션 도입 수량 순위 (12월 기준)", 
+                         color='인덕션_추정_수', color_continuous_scale='Blues')
+        fig_gu2.update_layout(height=500)
+        st.plotly_chart(fig_gu2, use_container_width=True)
+
+    st.dataframe(
+        df_gu_stock,
+        column_config={
+            '전환율': st.column_config.NumberColumn(format='%.1f%%'),
+            '총청구계량기수': st.column_config.NumberColumn(format='%,d'),
+            '가스레인지연결전수': st.column_config.NumberColumn(format='%,d'),
+            '인덕션_추정_수': st.column_config.NumberColumn(format='%,d')
+        },
+        use_container_width=True, hide_index=True
+    )
+    st.download_button(f"📥 {sel_year}_구군별_다운로드", partial(convert_df, df_gu_stock), f"{sel_year}_구군별.csv", "text/csv")
+
+@st.fragment
+def render_region_drilldown(df, df_dec, input_monthly_usage):
+    """[4] 지역(구군) 선택 -> 연도별 흐름 (12월 기준 Stock + 연간 Flow)"""
+    st.subheader("4️⃣ 상세 분석: 지역(구군) 선택 ➡️ 연도별 흐름")
+    sel_region = st.selectbox("🏙️ 지역(구군)을 선택하세요:", df['시군구'].cat.remove_unused_categories().cat.categories.tolist())
+    
+    df_r_stock = df_dec[df_dec['시군구'] == sel_region]
+    df_r = df_r_stock.groupby('Year', observed=True, sort=False, as_index=False)[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum()
+    df_r['전환율'] = safe_pct(df_r['인덕션_추정_수'].to_numpy(), df_r['총청구계량기수'].to_numpy())
+    df_r['연간손실추정_m3'] = df_r['인덕션_추정_수'] * input_monthly_usage * 12
+    
+    df_r_filtered = df_r[df_r['Year'] >= 2017].copy()
+
+    c5, c6 = st.columns(2)
+    with c5:
+        fig_r1 = go.Figure(layout=DUAL_AXIS_LAYOUT)
+        fig_r1.add_traces([
+            go.Bar(x=df_r['Year'].to_numpy(), y=df_r['가스레인지연결전수'].to_numpy(), name='가스레인지', marker_color=COLOR_GAS),
+            go.Bar(x=df_r['Year'].to_numpy(), y=df_r['인덕션_추정_수'].to_numpy(), name='인덕션', marker_color=COLOR_INDUCTION),
+            go.Scattergl(x=df_r['Year'].to_numpy(), y=df_r['전환율'].to_numpy(), name='전환율(%)', mode='lines+markers+text',
+                         texttemplate='%{y:.1f}%', textposition='top center',
+                         line=dict(color=COLOR_LINE, width=3), yaxis='y2'),
+        ])
+        fig_r1.update_layout(title=f"[{sel_region}] 연도별 세대 구성 (12월 기준)", barmode='stack', legend=dict(orientation="h", y=-0.2), height=500, uirevision='static')
+        st.plotly_chart(fig_r1, use_container_width=True)
+    with c6:
+        fig_r2 = go.Figure(layout=DUAL_AXIS_LAYOUT)
+        # [수정] 딥 블루 적용
+        fig_r2.add_trace(go.Bar(
+            x=df_r_filtered['Year'].to_numpy(), 
+            y=df_r_filtered['연간손실추정_m3'].to_numpy(), 
+            name=f'[{sel_region}] 추정 손실량', 
+            marker_color=COLOR_LOSS_BLUE, 
+            texttemplate='%{y:,.0f}',
+            textposition='auto'
+        ))
+        fig_r2.update_layout(
+            title=f"[{sel_region}] 연도별 추정 손실량 추이 (m³)", 
+            legend=dict(orientation="h", y=-0.2),
+            yaxis=dict(title="손실량 (m³)"),
+            height=500,
+            uirevision='static'
+        )
+        st.plotly_chart(fig_r2, use_container_width=True)
+    st.dataframe(
+        df_r_filtered,
+        column_config={
+            '전환율': st.column_config.NumberColumn(format='%.1f%%'),
+            '총청구계량기수': st.column_config.NumberColumn(format='%,d'),
+            '가스레인지연결전수': st.column_config.NumberColumn(format='%,d'),
+            '인덕션_추정_수': st.column_config.NumberColumn(format='%,d'),
+            '연간손실추정_m3': st.column_config.NumberColumn(format='%,.0f')
+        },
+        use_container_width=True, hide_index=True
+    )
+    st.download_button(f"📥 {sel_region}_데이터 다운로드", partial(convert_df, df_r), f"{sel_region}_데이터.csv", "text/csv")
+
 # ---------------------------------------------------------
 # 3. 데이터 로드 및 사이드바 구성
 # ---------------------------------------------------------
 gas_url = "https://raw.githubusercontent.com/Han11112222/citygas-induction-dashboard/main/(ver4)%EA%B0%80%EC%A0%95%EC%9A%A9_%EA%B0%80%EC%8A%A4%EB%A0%88%EC%9D%B8%EC%A7%80_%EC%82%AC%EC%9A%A9%EC%9C%A0%EB%AC%B4(201501_202412).xlsx"
+sales_url = "https://raw.githubusercontent.com/Han11112222/citygas-induction-dashboard/main/%ED%8C%90%EB%A7%A4%EB%9F%89(%EA%B3%84%ED%9A%8D_%EC%8B%A4%EC%A0%81).xlsx"
 
-df_raw = load_data_final_v31(gas_url)
-df_sales_raw = load_sales_data_final_v31()
+# [병렬 로드] 두 파일을 동시에 내려받아 파싱 -> 콜드 스타트 대기시간이 둘 중 긴 쪽으로 줄어듦
+# (작업 스레드에도 스크립트 컨텍스트를 붙여 캐시/st.error가 정상 동작하도록 함)
+with ThreadPoolExecutor(max_workers=2, initializer=partial(add_script_run_ctx, ctx=get_script_run_ctx())) as ex:
+    gas_version, sales_version = ex.map(get_remote_version, [gas_url, sales_url])
+    fut_gas = ex.submit(load_data_final_v31, gas_url, gas_version)
+    fut_sales = ex.submit(load_sales_data_final_v31, sales_url, sales_version)
+
+    # [로드 실패 처리] 로더 예외는 캐시되지 않음 -> 여기서 표시하고 다음 rerun에서 다시 내려받음
+    try:
+        df_raw = fut_gas.result()
+    except Exception as e:
+        st.error(f"⚠️ 데이터 로드 실패: {e}")
+        df_raw = pd.DataFrame()
+    try:
+        df_sales_raw = fut_sales.result()
+    except Exception:
+        # 판매량 없이 진행 (판매량 컬럼은 0으로 표시)
+        df_sales_raw = pd.DataFrame()
+        sales_version = None
 
 if df_raw.empty:
     st.error("🚨 기본 데이터를 불러오지 못했습니다. 잠시 후 다시 시도해주세요.")
@@ -144,19 +574,18 @@ with st.sidebar:
     
     st.divider()
     
-    min_date, max_date = df_raw['Date'].min(), df_raw['Date'].max()
+    # df_raw는 날짜순 정렬 상태 -> 처음/마지막 값이 곧 최소/최대
+    min_date, max_date = df_raw['Date'].iloc[0], df_raw['Date'].iloc[-1]
     start_date, end_date = st.slider("조회 기간", min_date.date(), max_date.date(), (min_date.date(), max_date.date()), format="YYYY.MM")
     
-    regions = st.multiselect("지역 선택", sorted(df_raw['시군구'].unique()), default=sorted(df_raw['시군구'].unique()))
-    types = st.multiselect("용도 선택", sorted(df_raw['용도'].unique()), default=sorted(df_raw['용도'].unique()))
+    # 범주형 컬럼의 categories는 이미 정렬된 고유값 목록
+    region_options = df_raw['시군구'].cat.categories.tolist()
+    type_options = df_raw['용도'].cat.categories.tolist()
+    regions = st.multiselect("지역 선택", region_options, default=region_options)
+    types = st.multiselect("용도 선택", type_options, default=type_options)
 
-# 전역 필터 적용
-df = df_raw[
-    (df_raw['Date'].dt.date >= start_date) & 
-    (df_raw['Date'].dt.date <= end_date) & 
-    (df_raw['시군구'].isin(regions)) & 
-    (df_raw['용도'].isin(types))
-]
+# 전역 필터 적용 (원본 데이터; 12월 사전 집계본은 [4] 지역별 상세에서 같은 조건으로 필터)
+df = apply_global_filter(df_raw, start_date, end_date, regions, types)
 
 # ---------------------------------------------------------
 # 4. 메인 화면 로직
@@ -170,12 +599,13 @@ st.markdown(f"### 📊 {selected_menu}")
 if selected_menu == "원페이지 리뷰 (One Page Review)":
     
     # 1. 데이터 준비
-    df_dec = df[df['Date'].dt.month == 12].copy()
-    
-    # 연도별 집계
-    df_summary = df_dec.groupby('Year')[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum().reset_index()
-    df_summary['전환율'] = (df_summary['인덕션_추정_수'] / df_summary['총청구계량기수']) * 100
-    df_summary['연간손실_m3'] = df_summary['인덕션_추정_수'] * input_monthly_usage * 12
+    # 연도별 집계 = Menu 1과 같은 캐시 결과(df_year)를 재사용 (12월 기준 집계를 한 번만 계산)
+    _, df_year = build_trend_tables(
+        gas_url, gas_version, sales_url, sales_version,
+        start_date, end_date, tuple(regions), tuple(types)
+    )
+    df_year = add_loss_estimates(df_year, input_monthly_usage)
+    df_summary = df_year[['Year', '총청구계량기수', '가스레인지연결전수', '인덕션_추정_수', '전환율', '연간손실추정_m3']].rename(columns={'연간손실추정_m3': '연간손실_m3'})
     
     # 최신 연도, 전년도, 시작 연도
     latest_year = df_summary['Year'].max()
@@ -254,8 +684,8 @@ if selected_menu == "원페이지 리뷰 (One Page Review)":
         # 그래프 1: 전환율 추이
         with col1:
             fig_trend = go.Figure()
-            fig_trend.add_trace(go.Scatter(x=df_summary['Year'], y=df_summary['전환율'], mode='lines+markers+text',
-                                        name='전환율', text=df_summary['전환율'].apply(lambda x: f"{x:.1f}%"),
+            fig_trend.add_trace(go.Scatter(x=df_summary['Year'].to_numpy(), y=df_summary['전환율'].to_numpy(), mode='lines+markers+text',
+                                        name='전환율', texttemplate='%{y:.1f}%',
                                         textposition='bottom center', line=dict(color=COLOR_LINE, width=3)))
             fig_trend.update_layout(title="연도별 인덕션 전환율 추이", height=400)
             st.plotly_chart(fig_trend, use_container_width=True)
@@ -263,9 +693,9 @@ if selected_menu == "원페이지 리뷰 (One Page Review)":
         # 그래프 2: 손실량 추이
         with col2:
             fig_loss_trend = go.Figure()
-            fig_loss_trend.add_trace(go.Bar(x=df_summary['Year'], y=df_summary['연간손실_m3'],
+            fig_loss_trend.add_trace(go.Bar(x=df_summary['Year'].to_numpy(), y=df_summary['연간손실_m3'].to_numpy(),
                                             name='손실량', marker_color=COLOR_LOSS_BLUE,
-                                            text=df_summary['연간손실_m3'].apply(lambda x: f"{x:,.0f}"), textposition='auto'))
+                                            texttemplate='%{y:,.0f}', textposition='auto'))
             fig_loss_trend.update_layout(title="연도별 추정 손실량 추이 (m³)", height=400)
             st.plotly_chart(fig_loss_trend, use_container_width=True)
 
@@ -323,59 +753,35 @@ elif selected_menu == "1. 전환 추세 및 상세 분석":
 
     # 1. 월별 트렌드
     st.subheader("1️⃣ 월별 트렌드 (Time Series)")
-    df_m = df.groupby('Date')[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum().reset_index()
-    df_m['전환율'] = (df_m['인덕션_추정_수'] / df_m['총청구계량기수']) * 100
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_m['Date'], y=df_m['가스레인지연결전수'], name='가스레인지', stackgroup='one', line=dict(color=COLOR_GAS)))
-    fig.add_trace(go.Scatter(x=df_m['Date'], y=df_m['인덕션_추정_수'], name='인덕션(추정)', stackgroup='one', line=dict(color=COLOR_INDUCTION)))
-    fig.add_trace(go.Scatter(x=df_m['Date'], y=df_m['전환율'], name='전환율(%)', yaxis='y2', mode='lines+markers', line=dict(color=COLOR_LINE)))
-    
-    fig.update_layout(
-        yaxis2=dict(overlaying='y', side='right'), 
-        hovermode="x unified", 
-        legend=dict(orientation="h", y=1.1),
-        height=600 
+    # 월별/연도별 집계는 필터 조합 단위로 캐시 (build_trend_tables)
+    df_m, df_year = build_trend_tables(
+        gas_url, gas_version, sales_url, sales_version,
+        start_date, end_date, tuple(regions), tuple(types)
     )
+    df_year = add_loss_estimates(df_year, input_monthly_usage)
+    
+    fig = build_monthly_trend_fig(df_m)
     st.plotly_chart(fig, use_container_width=True)
     
-    df_m_filtered = df_m[df_m['Date'].dt.year >= 2017].copy()
-    st.dataframe(df_m_filtered.style.format({'전환율': '{:.1f}%','총청구계량기수': '{:,.0f}','가스레인지연결전수': '{:,.0f}','인덕션_추정_수': '{:,.0f}'}), use_container_width=True, hide_index=True)
-    st.download_button("📥 월별 데이터 다운로드", convert_df(df_m), "monthly_data.csv", "text/csv")
+    df_m_filtered = df_m[df_m['Date'] >= '2017-01-01'].copy()
+    st.dataframe(
+        df_m_filtered,
+        column_config={
+            '전환율': st.column_config.NumberColumn(format='%.1f%%'),
+            '총청구계량기수': st.column_config.NumberColumn(format='%,d'),
+            '가스레인지연결전수': st.column_config.NumberColumn(format='%,d'),
+            '인덕션_추정_수': st.column_config.NumberColumn(format='%,d')
+        },
+        use_container_width=True, hide_index=True
+    )
+    st.download_button("📥 월별 데이터 다운로드", partial(convert_df, df_m), "monthly_data.csv", "text/csv")
 
     st.divider()
 
     # [2] 연도별 분석
     st.subheader("2️⃣ 연도별 수량 및 손실 추정량 분석")
     
-    # --- 데이터 처리 ---
-    df_dec = df[df['Date'].dt.month == 12].copy()
-    df_year_stock = df_dec.groupby('Year')[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum().reset_index()
-    df_year_stock['Year'] = df_year_stock['Year'].astype(int)
-    df_year_stock['전환율'] = (df_year_stock['인덕션_추정_수'] / df_year_stock['총청구계량기수']) * 100
-    
-    # 연간 총 손실량 계산
-    df_year_stock['연간손실추정_m3'] = df_year_stock['인덕션_추정_수'] * input_monthly_usage * 12
-    
-    if not df_sales_raw.empty:
-        df_sales_raw['Year'] = df_sales_raw['Year'].astype(int)
-        df_sales_year = df_sales_raw.groupby('Year')[['가정용_판매량_전체', '전체_판매량']].sum().reset_index()
-    else:
-        df_sales_year = pd.DataFrame(columns=['Year', '가정용_판매량_전체', '전체_판매량'])
-
-    df_year = pd.merge(df_year_stock, df_sales_year, on='Year', how='left')
-    if not df_sales_year.empty:
-        df_year['가정용_판매량_전체'] = df_year['가정용_판매량_전체'].fillna(0)
-        df_year['전체_판매량'] = df_year['전체_판매량'].fillna(0)
-    else:
-        df_year['가정용_판매량_전체'] = 0
-        df_year['전체_판매량'] = 0
-        
-    df_year['잠재_가정용'] = df_year['가정용_판매량_전체'] + df_year['연간손실추정_m3']
-    df_year['손실점유율_가정'] = df_year.apply(lambda x: (x['연간손실추정_m3'] / x['잠재_가정용'] * 100) if x['잠재_가정용'] > 0 else 0, axis=1)
-    df_year['잠재_전체'] = df_year['전체_판매량'] + df_year['연간손실추정_m3']
-    df_year['손실점유율_전체'] = df_year.apply(lambda x: (x['연간손실추정_m3'] / x['잠재_전체'] * 100) if x['잠재_전체'] > 0 else 0, axis=1)
-
+    # --- 데이터 처리 (df_year: build_trend_tables 캐시 결과) ---
     df_year_filtered = df_year[df_year['Year'] >= 2017].copy()
     
     highlight_condition = df_year_filtered['전환율'] > 10.0
@@ -384,78 +790,18 @@ elif selected_menu == "1. 전환 추세 및 상세 분석":
 
     # --- 그래프 그리기 ---
     st.markdown("##### 1. 연도별 세대 구성(12월) 및 전환율")
-    fig_q = make_subplots(specs=[[{"secondary_y": True}]])
-    fig_q.add_trace(go.Bar(x=df_year['Year'], y=df_year['가스레인지연결전수'], name='가스레인지(12월)', marker_color=COLOR_GAS), secondary_y=False)
-    fig_q.add_trace(go.Bar(x=df_year['Year'], y=df_year['인덕션_추정_수'], name='인덕션(12월)', marker_color=COLOR_INDUCTION), secondary_y=False)
-    
-    # 텍스트 위치: bottom center
-    fig_q.add_trace(go.Scatter(
-        x=df_year['Year'], y=df_year['전환율'], name='전환율(%)', mode='lines+markers+text', 
-        text=df_year['전환율'].apply(lambda x: f"{x:.1f}%"), 
-        textposition='bottom center', 
-        textfont=dict(size=20, color=COLOR_TEXT_LIGHTGREY), 
-        line=dict(color=COLOR_LINE, width=3)
-    ), secondary_y=True)
-    
-    if start_highlight_year:
-        # 텍스트 제거하고 라인/배경만 유지
-        fig_q.add_vrect(
-            x0=start_highlight_year-0.5, x1=end_highlight_year+0.5, 
-            fillcolor=COLOR_HIGHLIGHT_BG, opacity=0.4, layer="below", line_width=0
-        )
-        fig_q.add_vline(
-            x=start_highlight_year-0.5, line_width=2, line_dash="dash", line_color=COLOR_HIGHLIGHT_LINE,
-        )
-
-    fig_q.update_layout(barmode='stack', legend=dict(orientation="h", y=1.1), height=500, hovermode="x unified")
-    fig_q.update_yaxes(title_text="세대수 (12월 기준)", secondary_y=False)
-    fig_q.update_yaxes(title_text="전환율 (%)", secondary_y=True, range=[0, df_year['전환율'].max()*1.2])
+    fig_q = build_yearly_stock_fig(
+        df_year[['Year', '가스레인지연결전수', '인덕션_추정_수', '전환율']], start_highlight_year, end_highlight_year
+    )
     st.plotly_chart(fig_q, use_container_width=True)
 
     st.markdown("---") 
 
     st.markdown("##### 2. 연간 가정용 손실량 추정 및 비중")
-    fig_loss = make_subplots(specs=[[{"secondary_y": True}]])
-    
     latest_year_val = df_year_filtered['Year'].max()
     latest_loss_val = df_year_filtered[df_year_filtered['Year'] == latest_year_val]['연간손실추정_m3'].values[0] if pd.notna(latest_year_val) else 0
 
-    # 1축: 손실량 (막대)
-    fig_loss.add_trace(go.Bar(
-        x=df_year_filtered['Year'],
-        y=df_year_filtered['연간손실추정_m3'],
-        name='연간 손실량(m³)',
-        marker_color=COLOR_LOSS_BLUE,
-    ), secondary_y=False)
-    
-    # 최신 연도 라벨
-    if pd.notna(latest_year_val):
-        fig_loss.add_trace(go.Scatter(
-            x=[latest_year_val],
-            y=[latest_loss_val],
-            mode='text',
-            text=[f"{latest_loss_val:,.0f} m³"],
-            textposition="top center",
-            textfont=dict(size=15, color=COLOR_LOSS_BLUE, family="Arial Black"),
-            showlegend=False,
-            hoverinfo='skip'
-        ), secondary_y=False)
-
-    # 2축: 비중 (선) - 텍스트 위치 bottom center, lightgrey
-    fig_loss.add_trace(go.Scatter(
-        x=df_year_filtered['Year'],
-        y=df_year_filtered['손실점유율_가정'],
-        name='손실 비중(%, 가정용 대비)',
-        mode='lines+markers+text', 
-        text=df_year_filtered['손실점유율_가정'].apply(lambda x: f"{x:.1f}%"), 
-        textposition='bottom center', 
-        textfont=dict(size=16, color=COLOR_TEXT_LIGHTGREY), 
-        line=dict(color=COLOR_LINE, width=3)
-    ), secondary_y=True)
-
-    fig_loss.update_layout(height=500, legend=dict(orientation="h", y=1.1), hovermode="x unified")
-    fig_loss.update_yaxes(title_text="연간 손실량 (m³)", secondary_y=False)
-    fig_loss.update_yaxes(title_text="손실 비중 (%)", secondary_y=True, range=[0, df_year_filtered['손실점유율_가정'].max()*1.2], showticklabels=False)
+    fig_loss = build_yearly_loss_fig(df_year_filtered, latest_year_val, latest_loss_val)
     st.plotly_chart(fig_loss, use_container_width=True)
 
     # [계산기] - [수정] 기본값 1000으로 변경
@@ -484,25 +830,13 @@ elif selected_menu == "1. 전환 추세 및 상세 분석":
     # (좌) 가정용 판매량 vs 손실량
     with col1:
         st.markdown("##### ① 가정용 판매량 vs 손실 추정량")
-        fig_u1 = make_subplots(specs=[[{"secondary_y": True}]])
-        fig_u1.add_trace(go.Bar(x=df_year_filtered['Year'], y=df_year_filtered['가정용_판매량_전체'], name='가정용 판매량', marker_color=COLOR_GAS, opacity=0.7), secondary_y=False)
-        fig_u1.add_trace(go.Bar(x=df_year_filtered['Year'], y=df_year_filtered['연간손실추정_m3'], name='손실량(우측)', marker_color=COLOR_LOSS_BLUE), secondary_y=False)
-        fig_u1.add_trace(go.Scatter(x=df_year_filtered['Year'], y=df_year_filtered['손실점유율_가정'], name='손실 비중', mode='lines+markers+text', text=df_year_filtered['손실점유율_가정'].apply(lambda x: f"{x:.2f}%"), textposition='top center', line=dict(color=COLOR_LINE, width=2)), secondary_y=True)
-        fig_u1.update_layout(barmode='stack', legend=dict(orientation="h", y=1.1), height=500)
-        fig_u1.update_yaxes(title_text="사용량 (m³)", secondary_y=False)
-        fig_u1.update_yaxes(title_text="손실 비중 (%)", secondary_y=True, showticklabels=False) 
+        fig_u1 = build_sales_loss_fig(df_year_filtered, '가정용_판매량_전체', '가정용 판매량', '손실점유율_가정')
         st.plotly_chart(fig_u1, use_container_width=True)
 
     # (우) 전체 판매량 vs 손실량
     with col2:
         st.markdown("##### ② 전체 판매량 vs 손실 추정량")
-        fig_u2 = make_subplots(specs=[[{"secondary_y": True}]])
-        fig_u2.add_trace(go.Bar(x=df_year_filtered['Year'], y=df_year_filtered['전체_판매량'], name='전체 판매량', marker_color=COLOR_GAS, opacity=0.7), secondary_y=False)
-        fig_u2.add_trace(go.Bar(x=df_year_filtered['Year'], y=df_year_filtered['연간손실추정_m3'], name='손실량(우측)', marker_color=COLOR_LOSS_BLUE), secondary_y=False)
-        fig_u2.add_trace(go.Scatter(x=df_year_filtered['Year'], y=df_year_filtered['손실점유율_전체'], name='손실 비중', mode='lines+markers+text', text=df_year_filtered['손실점유율_전체'].apply(lambda x: f"{x:.2f}%"), textposition='top center', line=dict(color=COLOR_LINE, width=2)), secondary_y=True)
-        fig_u2.update_layout(barmode='stack', legend=dict(orientation="h", y=1.1), height=500)
-        fig_u2.update_yaxes(title_text="사용량 (m³)", secondary_y=False)
-        fig_u2.update_yaxes(title_text="손실 비중 (%)", secondary_y=True, showticklabels=False)
+        fig_u2 = build_sales_loss_fig(df_year_filtered, '전체_판매량', '전체 판매량', '손실점유율_전체')
         st.plotly_chart(fig_u2, use_container_width=True)
     
     # [표 하이라이트]
@@ -520,83 +854,16 @@ elif selected_menu == "1. 전환 추세 및 상세 분석":
         ),
         use_container_width=True, hide_index=True
     )
-    st.download_button("📥 상세 데이터 다운로드", convert_df(df_year_filtered), "detailed_data.csv", "text/csv")
+    st.download_button("📥 상세 데이터 다운로드", partial(convert_df, df_year_filtered), "detailed_data.csv", "text/csv")
 
     st.divider()
 
     # [3] Drill-down Step 1: 연도 선택 -> 구군별 비교 (12월 기준)
-    st.subheader("3️⃣ 상세 분석: 연도 선택 ➡️ 구군별 비교")
-    sel_year = st.selectbox("📅 분석할 연도를 선택하세요:", sorted(df['Year'].unique(), reverse=True))
-    
-    df_gu_stock = df[(df['Year'] == sel_year) & (df['Date'].dt.month == 12)].groupby('시군구')[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum().reset_index()
-    if df_gu_stock.empty:
-         last_month = df[df['Year'] == sel_year]['Date'].max().month
-         df_gu_stock = df[(df['Year'] == sel_year) & (df['Date'].dt.month == last_month)].groupby('시군구')[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum().reset_index()
-
-    df_gu_stock['전환율'] = (df_gu_stock['인덕션_추정_수'] / df_gu_stock['총청구계량기수']) * 100
-    
-    c3, c4 = st.columns(2)
-    with c3:
-        fig_gu1 = make_subplots(specs=[[{"secondary_y": True}]])
-        fig_gu1.add_trace(go.Bar(x=df_gu_stock['시군구'], y=df_gu_stock['가스레인지연결전수'], name='가스레인지', marker_color=COLOR_GAS), secondary_y=False)
-        fig_gu1.add_trace(go.Bar(x=df_gu_stock['시군구'], y=df_gu_stock['인덕션_추정_수'], name='인덕션', marker_color=COLOR_INDUCTION), secondary_y=False)
-        fig_gu1.add_trace(go.Scatter(x=df_gu_stock['시군구'], y=df_gu_stock['전환율'], name='전환율(%)', mode='lines+markers+text',
-                                     text=df_gu_stock['전환율'].apply(lambda x: f"{x:.1f}%"), textposition='top center',
-                                     line=dict(color=COLOR_LINE, width=3)), secondary_y=True)
-        fig_gu1.update_layout(title=f"[{sel_year}년] 구군별 세대 구성 (12월 기준)", barmode='stack', legend=dict(orientation="h", y=-0.2), height=500)
-        st.plotly_chart(fig_gu1, use_container_width=True)
-
-    with c4:
-        df_gu_sort = df_gu_stock.sort_values(by='인덕션_추정_수', ascending=False)
-        fig_gu2 = px.bar(df_gu_sort, x='시군구', y='인덕션_추정_수', text_auto='.2s', 
-                         title=f"[{sel_year}년] 구군별 인덕션 도입 수량 순위 (12월 기준)", 
-                         color='인덕션_추정_수', color_continuous_scale='Blues')
-        fig_gu2.update_layout(height=500)
-        st.plotly_chart(fig_gu2, use_container_width=True)
-
-    st.dataframe(df_gu_stock.style.format({'전환율': '{:.1f}%', '총청구계량기수': '{:,.0f}', '가스레인지연결전수': '{:,.0f}', '인덕션_추정_수': '{:,.0f}'}), use_container_width=True, hide_index=True)
-    st.download_button(f"📥 {sel_year}_구군별_다운로드", convert_df(df_gu_stock), f"{sel_year}_구군별.csv", "text/csv")
+    render_gu_drilldown(df)
 
     st.divider()
 
     # [4] 상세분석: 지역별 흐름 (12월 기준 Stock + 연간 Flow)
-    st.subheader("4️⃣ 상세 분석: 지역(구군) 선택 ➡️ 연도별 흐름")
-    sel_region = st.selectbox("🏙️ 지역(구군)을 선택하세요:", sorted(df['시군구'].unique()))
-    
-    df_r_stock = df[(df['시군구'] == sel_region) & (df['Date'].dt.month == 12)].copy()
-    df_r = df_r_stock.groupby('Year')[['총청구계량기수', '가스레인지연결전수', '인덕션_추정_수']].sum().reset_index()
-    df_r['전환율'] = (df_r['인덕션_추정_수'] / df_r['총청구계량기수']) * 100
-    df_r['연간손실추정_m3'] = df_r['인덕션_추정_수'] * input_monthly_usage * 12
-    
-    df_r_filtered = df_r[df_r['Year'] >= 2017].copy()
-
-    c5, c6 = st.columns(2)
-    with c5:
-        fig_r1 = make_subplots(specs=[[{"secondary_y": True}]])
-        fig_r1.add_trace(go.Bar(x=df_r['Year'], y=df_r['가스레인지연결전수'], name='가스레인지', marker_color=COLOR_GAS), secondary_y=False)
-        fig_r1.add_trace(go.Bar(x=df_r['Year'], y=df_r['인덕션_추정_수'], name='인덕션', marker_color=COLOR_INDUCTION), secondary_y=False)
-        fig_r1.add_trace(go.Scatter(x=df_r['Year'], y=df_r['전환율'], name='전환율(%)', mode='lines+markers+text',
-                                    text=df_r['전환율'].apply(lambda x: f"{x:.1f}%"), textposition='top center',
-                                    line=dict(color=COLOR_LINE, width=3)), secondary_y=True)
-        fig_r1.update_layout(title=f"[{sel_region}] 연도별 세대 구성 (12월 기준)", barmode='stack', legend=dict(orientation="h", y=-0.2), height=500)
-        st.plotly_chart(fig_r1, use_container_width=True)
-    with c6:
-        fig_r2 = make_subplots(specs=[[{"secondary_y": True}]])
-        # [수정] 딥 블루 적용
-        fig_r2.add_trace(go.Bar(
-            x=df_r_filtered['Year'], 
-            y=df_r_filtered['연간손실추정_m3'], 
-            name=f'[{sel_region}] 추정 손실량', 
-            marker_color=COLOR_LOSS_BLUE, 
-            text=df_r_filtered['연간손실추정_m3'].apply(lambda x: f"{x:,.0f}"),
-            textposition='auto'
-        ), secondary_y=False) 
-        fig_r2.update_layout(
-            title=f"[{sel_region}] 연도별 추정 손실량 추이 (m³)", 
-            legend=dict(orientation="h", y=-0.2),
-            yaxis=dict(title="손실량 (m³)"),
-            height=500
-        )
-        st.plotly_chart(fig_r2, use_container_width=True)
-    st.dataframe(df_r_filtered.style.format({'전환율': '{:.1f}%', '총청구계량기수': '{:,.0f}', '가스레인지연결전수': '{:,.0f}', '인덕션_추정_수': '{:,.0f}', '연간손실추정_m3': '{:,.0f}'}), use_container_width=True, hide_index=True)
-    st.download_button(f"📥 {sel_region}_데이터 다운로드", convert_df(df_r), f"{sel_region}_데이터.csv", "text/csv")
+    # 12월 사전 집계본(캐시)에 사이드바 전역 필터와 같은 조건 적용
+    df_dec = apply_global_filter(load_dec_stock_v31(gas_url, gas_version), start_date, end_date, regions, types)
+    render_region_drilldown(df, df_dec, input_monthly_usage)